@@ -2,108 +2,405 @@ import subprocess
 import sys
 import time
 import os
-
-# Check for minimum number of input files (at least one pair)
-if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
-    print("Usage: python3 bioinformatics_pipeline.py <file1_R1.fastq.gz> <file1_R2.fastq.gz> [<file2_R1.fastq.gz> <file2_R2.fastq.gz> ...]")
-    sys.exit(1)
-
-# Extract paired FASTQ files from command line arguments
-paired_fastq_files = sys.argv[1:]
+import glob
+import shutil
+import shlex
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 
 # Define paths to tools and resources
 BWA_MEM2_PATH = "/path/to/bwa-mem2"
-PICARD_PATH = "/path/to/picard.jar"
 REFERENCE_GENOME = "/path/to/reference_genome/hg38.fasta"
 MANTA_CONFIG_PATH = "/path/to/manta/bin/configManta.py"
 EXPANSIONHUNTER_PATH = "/path/to/ExpansionHunter"
 STRANGER_PATH = "/path/to/stranger/resources/variant_catalog.json"
 SNPEFF_PATH = "/path/to/snpEff/snpEff.jar"
-DEEPVARIANT_IMAGE = "google/deepvariant:1.2.0"
+DELLY_EXCLUDE_PATH = "/path/to/delly/excludeTemplates/human.hg38.excl.tsv"
+DEEPVARIANT_IMAGE = "google/deepvariant:1.6.0"
+DEEPVARIANT_GPU_IMAGE = "google/deepvariant:1.6.0-gpu"
+DEEPVARIANT_BATCH_SIZE = 1024  # call_variants batch size on the GPU
 BASE_RESULTS_DIR = "./Results"  # Base directory for results
+TOTAL_THREADS = os.cpu_count() or 1
+THREADS_PER_SAMPLE = min(16, TOTAL_THREADS)  # Threads handed to each pair's tools
+RAM_PER_SAMPLE_GB = 100  # Memory budget per concurrent pair; samtools sort buffers are sized to fit it
+FASTQ_SHARDS = 4  # Number of FASTQ splits aligned concurrently per pair
+BWA_MEM2_INDEX_GB = 16  # Resident hg38 bwa-mem2 index; every shard loads its own copy
+SORT_MEM_MIN_MB = 768  # samtools sort's default -m, used when the budget leaves less
+SORT_TMP_ROOT = BASE_RESULTS_DIR  # samtools sort spill files; point at local SSD/tmpfs, not NFS
+
+def format_command(command):
+    """Render a command or pipeline for log messages."""
+    pipeline = command if isinstance(command[0], list) else [command]
+    return " | ".join(shlex.join(argv) for argv in pipeline)
+
+# Child processes of every pair still running, so that one failing pair can
+# stop the rest of the run; once stopping is set no new command is started
+_live_processes = set()
+_live_lock = threading.Lock()
+_stopping = threading.Event()
+
+def stop_commands():
+    """Refuse new commands and terminate every running one."""
+    _stopping.set()
+    with _live_lock:
+        for process in _live_processes:
+            process.terminate()
 
-def run_command(command):
-    """Run a shell command and print its runtime."""
+def start_command(command, stdout=None, env=None):
+    """Start a command (an argv list) or a pipeline (a list of argv lists) without a shell.
+
+    Each stage's stdout feeds the next stage's stdin; the last stage writes to
+    the stdout file object if given. stderr is spooled to temporary files so a
+    chatty stage cannot block the others on a full pipe.
+    """
+    pipeline = command if isinstance(command[0], list) else [command]
+    processes, stderr_files = [], []
+    upstream = None
+    with _live_lock:
+        if _stopping.is_set():
+            raise RuntimeError(f"Not starting '{format_command(command)}': the pipeline is stopping.")
+        for k, argv in enumerate(pipeline):
+            stderr_file = tempfile.TemporaryFile()
+            last = k == len(pipeline) - 1
+            process = subprocess.Popen(argv, stdin=upstream, stdout=(stdout or subprocess.DEVNULL) if last else subprocess.PIPE, stderr=stderr_file, env=env)
+            if upstream is not None:
+                upstream.close()  # Let the upstream stage see SIGPIPE if this one exits early
+            upstream = process.stdout
+            processes.append(process)
+            stderr_files.append(stderr_file)
+            _live_processes.add(process)
+    return processes, stderr_files
+
+def wait_command(command, processes, stderr_files):
+    """Wait for every stage of a started command; report each failing stage and raise CalledProcessError."""
+    failed = None
+    for k, (process, stderr_file) in enumerate(zip(processes, stderr_files)):
+        process.wait()
+        with _live_lock:
+            _live_processes.discard(process)
+        # An upstream stage killed by SIGPIPE only means a later stage stopped
+        # reading; that later stage's own status decides the outcome
+        upstream_sigpipe = k < len(processes) - 1 and process.returncode == -signal.SIGPIPE
+        if process.returncode != 0 and not upstream_sigpipe:
+            failed = failed or process
+            stderr_file.seek(0)
+            print(f"Command '{shlex.join(process.args)}' failed with return code: {process.returncode}")
+            print(stderr_file.read().decode())
+        stderr_file.close()
+    if failed:
+        print(f"Pipeline '{format_command(command)}' failed.")
+        raise subprocess.CalledProcessError(failed.returncode, format_command(command))
+
+def run_command(command, stdout=None, env=None):
+    """Run a command or pipeline, optionally writing its output to the stdout path, and print its runtime."""
     start_time = time.time()
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+    if stdout is None:
+        wait_command(command, *start_command(command, env=env))
+    else:
+        with open(stdout, "wb") as out:
+            wait_command(command, *start_command(command, stdout=out, env=env))
     end_time = time.time()
 
     elapsed_time = end_time - start_time
     formatted_time = time.strftime("%H:%M:%S", time.gmtime(elapsed_time))
-    print(f"Command '{command}' took {formatted_time} to complete.")
+    print(f"Command '{format_command(command)}' took {formatted_time} to complete.")
 
-    if process.returncode != 0:
-        print(f"Command '{command}' failed with return code: {process.returncode}")
-        print(stderr.decode())
-        sys.exit(1)
+def run_commands_parallel(commands, env=None):
+    """Run several commands or pipelines concurrently and print their combined runtime."""
+    start_time = time.time()
+    started = []
+    try:
+        for command in commands:
+            started.append(start_command(command, env=env))
+        for command, (processes, stderr_files) in zip(commands, started):
+            wait_command(command, processes, stderr_files)
+    except BaseException:
+        # Don't leave the sibling commands running once one has failed
+        for processes, stderr_files in started:
+            for process in processes:
+                if process.poll() is None:
+                    process.terminate()
+            for process in processes:
+                process.wait()
+                with _live_lock:
+                    _live_processes.discard(process)
+            for stderr_file in stderr_files:
+                stderr_file.close()
+        raise
+    end_time = time.time()
+
+    elapsed_time = end_time - start_time
+    formatted_time = time.strftime("%H:%M:%S", time.gmtime(elapsed_time))
+    print(f"{len(commands)} parallel commands took {formatted_time} to complete.")
+
+def fastq_stem(path):
+    """Strip the FASTQ (and optional .gz) extension the way seqkit names its parts."""
+    name = os.path.basename(path)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+def free_ram_gb():
+    """Return the currently available physical memory in GB."""
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") // (1024 ** 3)
+
+def sort_threads(threads_per_sample):
+    """samtools sort threads alive at once in one pair: two sorts in every shard's stream."""
+    return 2 * max(threads_per_sample, FASTQ_SHARDS)
+
+def sort_mem_per_thread_mb(threads_per_sample):
+    """samtools sort -m: what the shards' bwa-mem2 indexes leave of RAM_PER_SAMPLE_GB, split over all sort threads."""
+    spare_mb = (RAM_PER_SAMPLE_GB - FASTQ_SHARDS * BWA_MEM2_INDEX_GB) * 1024
+    return max(SORT_MEM_MIN_MB, spare_mb // sort_threads(threads_per_sample))
+
+def ram_per_sample_gb(threads_per_sample):
+    """Peak memory of one pair during alignment: a bwa-mem2 index per shard plus every sort buffer."""
+    sort_mb = sort_threads(threads_per_sample) * sort_mem_per_thread_mb(threads_per_sample)
+    return FASTQ_SHARDS * BWA_MEM2_INDEX_GB + -(-sort_mb // 1024)
+
+@dataclass(frozen=True)
+class Paths:
+    """All directories and files used for one pair, computed once up front."""
+    results_dir: str
+    snv_dir: str
+    sv_dir: str
+    manta_run_dir: str
+    repeat_dir: str
+    split_dir: str
+    tmp_sort_dir: str
+    cram_marked: str
+    dup_metrics: str
+    merged_sv: str
+    dv_mounts: tuple
+    dv_examples: str
+    dv_gvcf_examples: str
+    dv_call_output: str
+
+    @classmethod
+    def for_pair(cls, pair_id, threads_per_sample):
+        results_dir = os.path.join(BASE_RESULTS_DIR, pair_id)
+        snv_dir = os.path.join(results_dir, "SNV")
+        sv_dir = os.path.join(results_dir, "SV")
+        abs_ref_dir = os.path.abspath(os.path.dirname(REFERENCE_GENOME))
+        return cls(
+            results_dir=results_dir,
+            snv_dir=snv_dir,
+            sv_dir=sv_dir,
+            manta_run_dir=os.path.join(sv_dir, "manta"),
+            repeat_dir=os.path.join(results_dir, "repeatExpansions"),
+            split_dir=os.path.join(results_dir, "fastq_parts"),
+            tmp_sort_dir=os.path.join(SORT_TMP_ROOT, pair_id, "tmp_sort"),
+            cram_marked=os.path.join(results_dir, f"{pair_id}_aligned.sorted.marked.cram"),
+            dup_metrics=os.path.join(results_dir, f"{pair_id}_marked_dup_metrics.txt"),
+            merged_sv=os.path.join(sv_dir, "merged_sv.vcf"),
+            # DeepVariant runs in docker, so these are container-side paths
+            dv_mounts=("-v", f"{os.path.abspath(results_dir)}:/input", "-v", f"{abs_ref_dir}:/ref", "-v", f"{os.path.abspath(snv_dir)}:/output"),
+            dv_examples=f"/output/{pair_id}_examples.tfrecord@{threads_per_sample}.gz",
+            dv_gvcf_examples=f"/output/{pair_id}_gvcf.tfrecord@{threads_per_sample}.gz",
+            dv_call_output=f"/output/{pair_id}_call_variants_output.tfrecord.gz",
+        )
+
+def align_pair(pair_id, paths, input_file_1, input_file_2, threads_per_sample):
+    """Align one pair of FASTQ files into a duplicate-marked, indexed CRAM."""
+    cram = paths.cram_marked
 
-# Loop over each pair of input files
-for i in range(0, len(paired_fastq_files), 2):
-    input_file_1 = paired_fastq_files[i]
-    input_file_2 = paired_fastq_files[i+1]
-    
-    # Generate a unique directory name for each pair
-    pair_id = os.path.splitext(os.path.basename(input_file_1))[0]  # Customize as needed for uniqueness
-    results_dir = os.path.join(BASE_RESULTS_DIR, pair_id)
-    
     # Create directories for each pair
-    os.makedirs(results_dir, exist_ok=True)
-    snv_dir = os.path.join(results_dir, "SNV")
-    sv_dir = os.path.join(results_dir, "SV")
-    manta_run_dir = os.path.join(sv_dir, "manta")
-    os.makedirs(snv_dir, exist_ok=True)
-    os.makedirs(sv_dir, exist_ok=True)
-    os.makedirs(manta_run_dir, exist_ok=True)
-
-    # Align reads using bwa-mem2 with the input files
-    run_command(f"{BWA_MEM2_PATH} mem {REFERENCE_GENOME} {input_file_1} {input_file_2} > {results_dir}/{pair_id}_aligned.sam")
-    
-    # Convert SAM to BAM, sort BAM, and mark duplicates for each pair
-    run_command(f"samtools view -bS {results_dir}/{pair_id}_aligned.sam > {results_dir}/{pair_id}_aligned.bam")
-    run_command(f"samtools sort {results_dir}/{pair_id}_aligned.bam -o {results_dir}/{pair_id}_aligned.sorted.bam")
-    run_command(f"java -jar {PICARD_PATH} MarkDuplicates I={results_dir}/{pair_id}_aligned.sorted.bam O={results_dir}/{pair_id}_aligned.sorted.marked.bam M={results_dir}/{pair_id}_marked_dup_metrics.txt")
-
-    # Index BAM file and validate it for each pair
-    run_command(f"samtools index {results_dir}/{pair_id}_aligned.sorted.marked.bam")
-    run_command(f"java -jar {PICARD_PATH} ValidateSamFile I={results_dir}/{pair_id}_aligned.sorted.marked.bam MODE=SUMMARY")
-
-    # Add or replace read groups for each pair
-    run_command(f"java -jar {PICARD_PATH} AddOrReplaceReadGroups I={results_dir}/{pair_id}_aligned.sorted.marked.bam O={results_dir}/{pair_id}_aligned.sorted.marked_with_rg.bam RGID={pair_id} RGLB={pair_id}_LB RGPL=illumina RGPU={pair_id}_PU RGSM={pair_id}")
-
-    # Index the BAM file again for each pair
-    run_command(f"samtools index {results_dir}/{pair_id}_aligned.sorted.marked_with_rg.bam")
-
-    deepvariant_cmd = " --model_type=WES --ref=/ref/{REFERENCE_GENOME.split('/')[-1]} --reads=/input/{pair_id}_aligned.sorted.marked_with_rg.bam --output_vcf=/output/{pair_id}_output_variants.vcf --output_gvcf=/output/{pair_id}_output_variants.g.vcf.gz --num_shards=8"
-    run_command(f"sudo docker run -v {os.path.abspath(results_dir)}:/input -v {os.path.abspath(REFERENCE_GENOME.rsplit('/', 1)[0])}:/ref -v {os.path.abspath(snv_dir)}:/output {DEEPVARIANT_IMAGE} {deepvariant_cmd.format(pair_id=pair_id)}")
+    for directory in (paths.snv_dir, paths.manta_run_dir, paths.repeat_dir, paths.tmp_sort_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    # Split the pair into FASTQ_SHARDS chunks and align them concurrently. Each
+    # shard is aligned, mate-fixed and coordinate-sorted in one stream with the
+    # same read group injected by bwa-mem2, so the parts can be merged directly.
+    # Everything written to disk from here on is reference-compressed CRAM
+    run_command(["seqkit", "split2", "-p", str(FASTQ_SHARDS), "-j", str(threads_per_sample), "-1", input_file_1, "-2", input_file_2, "-O", paths.split_dir, "-f"])
+    parts_1 = sorted(glob.glob(os.path.join(paths.split_dir, f"{fastq_stem(input_file_1)}.part_*")))
+    parts_2 = sorted(glob.glob(os.path.join(paths.split_dir, f"{fastq_stem(input_file_2)}.part_*")))
+    shard_threads = max(1, threads_per_sample // len(parts_1))
+    sort_mem = f"{sort_mem_per_thread_mb(threads_per_sample)}M"
+    read_group = f"@RG\\tID:{pair_id}\\tSM:{pair_id}\\tPL:illumina\\tLB:{pair_id}_LB\\tPU:{pair_id}_PU"
+    part_crams = [os.path.join(paths.results_dir, f"{pair_id}_part_{k}.cram") for k in range(len(parts_1))]
+    run_commands_parallel([
+        [
+            [BWA_MEM2_PATH, "mem", "-t", str(shard_threads), "-R", read_group, REFERENCE_GENOME, part_1, part_2],
+            ["samtools", "sort", "-n", "-@", str(shard_threads), "-m", sort_mem, "-l", "0", "-T", f"{paths.tmp_sort_dir}/part_{k}_name", "-"],
+            ["samtools", "fixmate", "-m", "-@", str(shard_threads), "-u", "-", "-"],
+            ["samtools", "sort", "-@", str(shard_threads), "-m", sort_mem, "-O", "cram", "--reference", REFERENCE_GENOME, "-T", f"{paths.tmp_sort_dir}/part_{k}_coord", "-o", part_cram, "-"],
+        ]
+        for k, (part_1, part_2, part_cram) in enumerate(zip(parts_1, parts_2, part_crams))
+    ])
+    shutil.rmtree(paths.split_dir)
+    shutil.rmtree(paths.tmp_sort_dir)
+
+    # Merge the sorted parts (combining the identical @RG headers) and mark
+    # duplicates in one stream; the merged stream stays uncompressed, and the
+    # final CRAM's index is built while it is written instead of in a second pass
+    run_command([
+        ["samtools", "merge", "-c", "-p", "-u", "-@", str(threads_per_sample), "--reference", REFERENCE_GENOME, "-", *part_crams],
+        ["samtools", "markdup", "-@", str(threads_per_sample), "-f", paths.dup_metrics, "--output-fmt", "cram", "--reference", REFERENCE_GENOME, "--write-index", "-", f"{cram}##idx##{cram}.crai"],
+    ])
+    for part_cram in part_crams:
+        os.remove(part_cram)
+
+    # Validate the CRAM file for each pair
+    run_command(["samtools", "quickcheck", "-v", cram])
+
+def run_make_examples(pair_id, paths, threads_per_sample):
+    """DeepVariant stage 1: sharded make_examples on the CPU image."""
+    run_command([
+        "sudo", "docker", "run", *paths.dv_mounts, DEEPVARIANT_IMAGE,
+        "parallel", "-j", str(threads_per_sample), "--halt", "2",
+        "/opt/deepvariant/bin/make_examples", "--mode", "calling",
+        "--ref", f"/ref/{os.path.basename(REFERENCE_GENOME)}",
+        "--reads", f"/input/{os.path.basename(paths.cram_marked)}",
+        "--examples", paths.dv_examples, "--gvcf", paths.dv_gvcf_examples,
+        "--channels", "insert_size", "--task", "{}",
+        ":::", *(str(task) for task in range(threads_per_sample)),
+    ])
+
+def run_call_variants(pair_id, paths, threads_per_sample):
+    """DeepVariant stage 2: call_variants, the only stage placed on the GPU."""
+    run_command([
+        "sudo", "docker", "run", "--gpus", "all", *paths.dv_mounts, DEEPVARIANT_GPU_IMAGE,
+        "/opt/deepvariant/bin/call_variants",
+        "--examples", paths.dv_examples, "--checkpoint", "/opt/models/wes",
+        "--outfile", paths.dv_call_output, "--batch_size", str(DEEPVARIANT_BATCH_SIZE),
+    ])
+
+def run_postprocess(pair_id, paths, threads_per_sample):
+    """DeepVariant stage 3: postprocess_variants on the CPU image."""
+    run_command([
+        "sudo", "docker", "run", *paths.dv_mounts, DEEPVARIANT_IMAGE,
+        "/opt/deepvariant/bin/postprocess_variants",
+        "--ref", f"/ref/{os.path.basename(REFERENCE_GENOME)}",
+        "--infile", paths.dv_call_output,
+        "--outfile", f"/output/{pair_id}_output_variants.vcf",
+        "--nonvariant_site_tfrecord_path", paths.dv_gvcf_examples,
+        "--gvcf_outfile", f"/output/{pair_id}_output_variants.g.vcf.gz",
+    ])
+
+def prepare_pair(pair_id, paths, input_file_1, input_file_2, threads_per_sample):
+    """CPU stage before the GPU: alignment and DeepVariant make_examples."""
+    align_pair(pair_id, paths, input_file_1, input_file_2, threads_per_sample)
+    run_make_examples(pair_id, paths, threads_per_sample)
+
+def finish_pair(pair_id, paths, threads_per_sample):
+    """CPU stage after the GPU: DeepVariant postprocessing, SV calling, repeat expansions and annotation."""
+    run_postprocess(pair_id, paths, threads_per_sample)
+    cram = paths.cram_marked
 
     # For configuring and running Manta for structural variant calling
-    manta_run_dir = os.path.join(sv_dir, "manta")
-    os.makedirs(manta_run_dir, exist_ok=True)
-    run_command(f'"{MANTA_CONFIG_PATH}" --bam "{results_dir}/{pair_id}_aligned.sorted.marked_with_rg.bam" --referenceFasta "{REFERENCE_GENOME}" --runDir "{manta_run_dir}"')
-    run_command(f"{manta_run_dir}/runWorkflow.py -m local")
+    run_command([MANTA_CONFIG_PATH, "--bam", cram, "--referenceFasta", REFERENCE_GENOME, "--runDir", paths.manta_run_dir])
+    run_command([os.path.join(paths.manta_run_dir, "runWorkflow.py"), "-m", "local"])
 
-    # For calling structural variants with Delly
-    for sv_type in ["DEL", "DUP"]:
-        output_bcf = f"{sv_dir}/delly_{sv_type.lower()}.bcf"
-        run_command(f"delly call -t {sv_type} -g {REFERENCE_GENOME} -o {output_bcf} {results_dir}/{pair_id}_aligned.sorted.marked_with_rg.bam")
-        run_command(f"bcftools view {output_bcf} > {output_bcf.replace('.bcf', '.vcf')}")
+    # For calling structural variants with Delly; the SV types are independent,
+    # so both passes run concurrently, each pinned to a single OpenMP thread
+    output_bcfs = [os.path.join(paths.sv_dir, f"delly_{sv_type.lower()}.bcf") for sv_type in ["DEL", "DUP"]]
+    run_commands_parallel([
+        ["delly", "call", "-t", sv_type, "-g", REFERENCE_GENOME, "-x", DELLY_EXCLUDE_PATH, "-o", output_bcf, cram]
+        for sv_type, output_bcf in zip(["DEL", "DUP"], output_bcfs)
+    ], env={**os.environ, "OMP_NUM_THREADS": "1"})
+    run_commands_parallel([
+        ["bcftools", "view", "--threads", str(threads_per_sample), "-o", output_bcf.replace(".bcf", ".vcf"), output_bcf]
+        for output_bcf in output_bcfs
+    ])
 
     # For merging SVs with SVDB
-    run_command(f"svdb --merge --notag --vcf {sv_dir}/manta/results/variants/*.vcf.gz --vcf {sv_dir}/delly_*.vcf > {sv_dir}/merged_sv.vcf")
+    manta_vcfs = sorted(glob.glob(os.path.join(paths.manta_run_dir, "results", "variants", "*.vcf.gz")))
+    delly_vcfs = sorted(glob.glob(os.path.join(paths.sv_dir, "delly_*.vcf")))
+    run_command(["svdb", "--merge", "--notag", "--vcf", *manta_vcfs, "--vcf", *delly_vcfs], stdout=paths.merged_sv)
 
     # For running ExpansionHunter for repeat expansions
-    repeat_expansions_dir = os.path.join(results_dir, "repeatExpansions")
-    os.makedirs(repeat_expansions_dir, exist_ok=True)
-    run_command(f"{EXPANSIONHUNTER_PATH} --reads {results_dir}/{pair_id}_aligned.sorted.marked_with_rg.bam --reference {REFERENCE_GENOME} --variant-catalog {EXPANSIONHUNTER_PATH.rsplit('/', 1)[0]}/variant_catalog/hg38/variant_catalog.json --output-prefix {repeat_expansions_dir}/{pair_id}_eh_output")
+    eh_prefix = os.path.join(paths.repeat_dir, f"{pair_id}_eh_output")
+    eh_catalog = os.path.join(os.path.dirname(EXPANSIONHUNTER_PATH), "variant_catalog", "hg38", "variant_catalog.json")
+    run_command([EXPANSIONHUNTER_PATH, "--reads", cram, "--reference", REFERENCE_GENOME, "--variant-catalog", eh_catalog, "--output-prefix", eh_prefix])
 
     # For annotating with stranger
-    run_command(f"stranger {repeat_expansions_dir}/{pair_id}_eh_output.vcf -f {STRANGER_PATH} > {repeat_expansions_dir}/{pair_id}_annotated_output.vcf")
+    run_command(["stranger", f"{eh_prefix}.vcf", "-f", STRANGER_PATH], stdout=os.path.join(paths.repeat_dir, f"{pair_id}_annotated_output.vcf"))
+
+    # For annotating SNVs and SVs with SnpEff: both call sets are concatenated
+    # so the JVM and the hg38 database are loaded once per pair, then the
+    # annotated records are split back apart on INFO/SVTYPE (set only on SVs)
+    snv_gvcf = os.path.join(paths.snv_dir, f"{pair_id}_output_variants.g.vcf.gz")
+    sv_gz = f"{paths.merged_sv}.gz"
+    combined = os.path.join(paths.results_dir, f"{pair_id}_combined.vcf.gz")
+    combined_ann = os.path.join(paths.results_dir, f"{pair_id}_combined.ann.vcf.gz")
+    run_command(["bcftools", "sort", "-Oz", "-o", sv_gz, paths.merged_sv])
+    run_command(["bcftools", "index", "-t", sv_gz])
+    run_command(["bcftools", "concat", "-a", "--threads", str(threads_per_sample), "-Oz", "-o", combined, snv_gvcf, sv_gz])
+    run_command([
+        ["java", "-Xmx8g", "-jar", SNPEFF_PATH, "-v", "-nodownload", "-noStats", "hg38", combined],
+        ["bgzip", "-@", str(threads_per_sample)],
+    ], stdout=combined_ann)
+    run_commands_parallel([
+        ["bcftools", "view", "-e", 'INFO/SVTYPE!="."', "-o", os.path.join(paths.snv_dir, f"{pair_id}_snv.ann.vcf"), combined_ann],
+        ["bcftools", "view", "-i", 'INFO/SVTYPE!="."', "-o", os.path.join(paths.sv_dir, f"{pair_id}_sv.ann.vcf"), combined_ann],
+    ])
+    for path in (combined, combined_ann):
+        os.remove(path)
+
+def run_after(previous, fn, *args):
+    """Wait for the previous stage's future to succeed, then run fn(*args)."""
+    previous.result()
+    return fn(*args)
+
+def run_holding(slots, fn, *args):
+    """Run fn(*args) while holding one of the shared CPU/RAM slots."""
+    with slots:
+        return fn(*args)
+
+if __name__ == "__main__":
+    # Check for minimum number of input files (at least one pair)
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python3 bioinformatics_pipeline.py <file1_R1.fastq.gz> <file1_R2.fastq.gz> [<file2_R1.fastq.gz> <file2_R2.fastq.gz> ...]")
+        sys.exit(1)
+
+    # Extract paired FASTQ files from command line arguments
+    paired_fastq_files = sys.argv[1:]
 
-    # For annotating SNVs and SVs with SnpEff
-    run_command(f"java -Xmx8g -jar {SNPEFF_PATH} -v hg38 {snv_dir}/{pair_id}_output_variants.g.vcf.gz > {snv_dir}/{pair_id}_snv.ann.vcf")
-    run_command(f"java -Xmx8g -jar {SNPEFF_PATH} -v hg38 {sv_dir}/merged_sv.vcf > {sv_dir}/{pair_id}_sv.ann.vcf")
+    # Run pairs concurrently, capped by both the thread and the RAM budget. Each
+    # pair flows through three pools so that while one pair holds the GPU in
+    # call_variants, the next is in make_examples and the previous is in
+    # postprocessing. The two CPU stages share one budget of `workers` slots,
+    # so at most that many pairs use CPU and RAM at any time. All work happens
+    # in external tools, so threads suffice
+    max_workers = max(1, TOTAL_THREADS // THREADS_PER_SAMPLE)
+    max_mem_workers = max(1, free_ram_gb() // ram_per_sample_gb(THREADS_PER_SAMPLE))
+    workers = min(max_workers, max_mem_workers)
+    cpu_slots = threading.BoundedSemaphore(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as cpu_make_pool, \
+             ThreadPoolExecutor(max_workers=1) as gpu_call_pool, \
+             ThreadPoolExecutor(max_workers=workers) as cpu_post_pool:
+            futures = {}
+            stage_futures = []
+            for i in range(0, len(paired_fastq_files), 2):
+                input_file_1 = paired_fastq_files[i]
+                input_file_2 = paired_fastq_files[i+1]
+                # Generate a unique directory name for each pair
+                pair_id = os.path.splitext(os.path.basename(input_file_1))[0]  # Customize as needed for uniqueness
+                paths = Paths.for_pair(pair_id, THREADS_PER_SAMPLE)
+                f_make = cpu_make_pool.submit(run_holding, cpu_slots, prepare_pair, pair_id, paths, input_file_1, input_file_2, THREADS_PER_SAMPLE)
+                f_call = gpu_call_pool.submit(run_after, f_make, run_call_variants, pair_id, paths, THREADS_PER_SAMPLE)
+                f_post = cpu_post_pool.submit(run_after, f_call, run_holding, cpu_slots, finish_pair, pair_id, paths, THREADS_PER_SAMPLE)
+                futures[f_post] = pair_id
+                stage_futures += [f_make, f_call, f_post]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    print(f"Pair '{futures[future]}' completed.")
+            except BaseException:
+                # The first failure stops the whole run: queued stages are
+                # dropped and the tools of pairs still running are terminated
+                for future in stage_futures:
+                    future.cancel()
+                stop_commands()
+                raise
+    except subprocess.CalledProcessError:
+        sys.exit(1)  # The failing command and its stderr have been printed
 
-print("Pipeline modifications for processing each pair of FASTQ files independently completed successfully.")
+    print("Pipeline modifications for processing each pair of FASTQ files independently completed successfully.")
 
 
@@ -8,15 +8,29 @@ from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
+from reportlab.lib import colors
+from reportlab.lib.utils import ImageReader
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, Table, TableStyle
+from xml.sax.saxutils import escape
 
-from vcf_pheno_core import parse_vcf, load_hpo_map, phenotype_score, prioritize
+from vcf_pheno_core import parse_vcf, load_hpo_map, hpo_gene_counts, phenotype_score, prioritize
 
 st.set_page_config(page_title="Gatomis VCF + Phenotype Analyzer (RUO)", layout="wide")
 
+# Logo is checked and decoded once per server process (Streamlit re-executes
+# this script on every rerun), not on every report/page
+@st.cache_resource
+def _load_logo():
+    return ImageReader("logo.png") if os.path.exists("logo.png") else None
+
+LOGO_IMG = _load_logo()
+LOGO_EXISTS = LOGO_IMG is not None
+
 # Header with logo
 col1, col2 = st.columns([1,3])
 with col1:
-    if os.path.exists("logo.png"):
+    if LOGO_EXISTS:
         st.image("logo.png", width=160)
 with col2:
     st.title("GATomics — VCF + Phenotype Analyzer (RUO)")
@@ -65,63 +79,140 @@ def parse_panel(file) -> list:
         st.warning(f"Could not parse panel: {e}")
         return None
 
-def pdf_report(summary_lines, table: pd.DataFrame):
+# Variant table layout for the PDF report (built once, reused for every report)
+VARIANT_COLS = ["CHROM","POS","REF","ALT","GENE","CONSEQUENCE","IMPACT","AF","DP","PHENO_SCORE","PANEL_MATCH","PRIORITY_SCORE"]
+VARIANT_HEADER = ["CHROM","POS","REF","ALT","GENE","CONSEQUENCE","IMPACT","AF","DP","PHENO","PANEL","SCORE"]
+VARIANT_COL_W = [w*mm for w in (12, 15, 16, 16, 16, 29, 16, 12, 10, 10, 10, 11)]
+VARIANT_CELL_MAX = 150  # characters kept per cell; longer values end in "..."
+# Cells wrap inside their column; CJK word wrap also breaks long alleles and
+# '&'-joined consequences that have no spaces
+VARIANT_CELL_STYLE = ParagraphStyle("variant_cell", fontName="Helvetica", fontSize=7, leading=8, wordWrap="CJK")
+VARIANT_TABLE_STYLE = TableStyle([
+    ("FONT", (0,0), (-1,-1), "Helvetica", 7),
+    ("FONT", (0,0), (-1,0), "Helvetica-Bold", 7),
+    ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
+    ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+    ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+    ("TOPPADDING", (0,0), (-1,-1), 1),
+    ("BOTTOMPADDING", (0,0), (-1,-1), 1),
+    ("LEFTPADDING", (0,0), (-1,-1), 2),
+    ("RIGHTPADDING", (0,0), (-1,-1), 2),
+])
+
+# Cached results stay in server memory, so every cache is bounded in entries
+# and age; uploaded VCFs and parsed frames are the large ones
+CACHE_TTL = 3600  # seconds
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_parse_vcf(vcf_bytes: bytes):
+    return parse_vcf(io.BytesIO(vcf_bytes))
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def _cached_hpo_map(map_bytes: bytes, sep: str) -> pd.DataFrame:
+    return load_hpo_map(pd.read_csv(io.BytesIO(map_bytes), sep=sep))
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=CACHE_TTL)
+def _cached_hpo_gene_counts(map_bytes: bytes, sep: str, hpo_terms: tuple) -> pd.Series:
+    return hpo_gene_counts(_cached_hpo_map(map_bytes, sep), list(hpo_terms))
+
+def variant_cell(value) -> Paragraph:
+    text = str(value)
+    if len(text) > VARIANT_CELL_MAX:
+        text = text[:VARIANT_CELL_MAX - 3] + "..."
+    # Paragraph text is markup, so symbolic alleles such as <DEL> are escaped
+    return Paragraph(escape(text), VARIANT_CELL_STYLE)
+
+@st.cache_data(show_spinner=False, max_entries=16, ttl=CACHE_TTL)
+def pdf_report(summary_lines, table: pd.DataFrame, report_title: str, lab_name: str,
+               patient_id: str, sex: str, age: str, prepared_by: str, reviewed_by: str,
+               generated_at: datetime):
     buf = io.BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
     W,H=A4; margin=18*mm
 
+    # layout constants (points)
+    TOP_Y = H - margin - 32*mm
+    PAGE_TOP_Y = H - margin - 20*mm
+    BOT_SECTION = margin + 35*mm
+    BOT_BLOCK = margin + 25*mm
+    BOT_TABLE = margin + 20*mm
+    LINE_H = 5*mm
+
+    # only switch fonts when name/size actually change; showPage() resets the font
+    cur_font = [None]
+    def sf(name, size):
+        if cur_font[0] != (name, size):
+            c.setFont(name, size); cur_font[0] = (name, size)
+    def new_page():
+        c.showPage(); cur_font[0] = None
+        return PAGE_TOP_Y
+
     # header with logo
-    if os.path.exists("logo.png"):
+    if LOGO_IMG is not None:
         try:
-            c.drawImage("logo.png", margin, H - margin - 18*mm, width=38*mm, height=16*mm, mask='auto')
+            c.drawImage(LOGO_IMG, margin, H - margin - 18*mm, width=38*mm, height=16*mm, mask='auto')
         except Exception:
             pass
-    c.setFont("Helvetica-Bold", 14)
+    sf("Helvetica-Bold", 14)
     c.drawRightString(W - margin, H - margin - 6*mm, report_title)
-    c.setFont("Helvetica", 9)
-    c.drawRightString(W - margin, H - margin - 12*mm, datetime.now().strftime("%Y-%m-%d %H:%M"))
-    c.setFont("Helvetica", 9)
+    sf("Helvetica", 9)
+    c.drawRightString(W - margin, H - margin - 12*mm, generated_at.strftime("%Y-%m-%d %H:%M"))
     c.drawString(margin, H - margin - 23*mm, f"Laboratory: {lab_name}")
     c.line(margin, H - margin - 25*mm, W - margin, H - margin - 25*mm)
 
-    y = H - margin - 32*mm
-    c.setFont("Helvetica-Bold", 11)
+    y = TOP_Y
+    sf("Helvetica-Bold", 11)
     c.drawString(margin, y, "Patient")
     y -= 6*mm
-    c.setFont("Helvetica", 9)
+    sf("Helvetica", 9)
     c.drawString(margin, y, f"Patient ID: {patient_id}   Sex: {sex}   Age: {age}")
     y -= 8*mm
-    c.setFont("Helvetica-Bold", 11)
+    sf("Helvetica-Bold", 11)
     c.drawString(margin, y, "Summary")
     y -= 6*mm
-    c.setFont("Helvetica", 9)
+    sf("Helvetica", 9)
     for line in summary_lines:
-        if y < margin + 25*mm:
-            c.showPage(); y = H - margin - 20*mm; c.setFont("Helvetica", 9)
+        if y < BOT_BLOCK:
+            y = new_page(); sf("Helvetica", 9)
         c.drawString(margin, y, line)
-        y -= 5*mm
+        y -= LINE_H
 
     # Table
-    cols = ["CHROM","POS","REF","ALT","GENE","CONSEQUENCE","IMPACT","AF","DP","PHENO_SCORE","PANEL_MATCH","PRIORITY_SCORE"]
-    if y < margin + 35*mm:
-        c.showPage(); y = H - margin - 20*mm
-    c.setFont("Helvetica-Bold", 11)
+    top = table[VARIANT_COLS].head(40).copy()
+    top["POS"] = top["POS"].astype(int)
+    top["PRIORITY_SCORE"] = top["PRIORITY_SCORE"].round(3)
+    data = [VARIANT_HEADER] + [[variant_cell(v) for v in row] for row in top.values.tolist()]
+    pending = Table(data, colWidths=VARIANT_COL_W, repeatRows=1)
+    pending.setStyle(VARIANT_TABLE_STYLE)
+
+    if y < BOT_SECTION:
+        y = new_page()
+    sf("Helvetica-Bold", 11)
     c.drawString(margin, y, "Top Prioritized Variants")
-    y -= 7*mm; c.setFont("Helvetica", 8)
-    for _, row in table[cols].head(40).iterrows():
-        line = f"{row['CHROM']}:{int(row['POS'])} {row['REF']}>{row['ALT']} | {str(row['GENE'])} | {str(row['CONSEQUENCE'])} | {str(row['IMPACT'])} | AF={row['AF']} | DP={row['DP']} | PHENO={row['PHENO_SCORE']} | PANEL={row['PANEL_MATCH']} | Score={round(row['PRIORITY_SCORE'],3)}"
-        if y < margin + 20*mm:
-            c.showPage(); y = H - margin - 20*mm; c.setFont("Helvetica", 8)
-        c.drawString(margin, y, line[:150])
-        y -= 4.5*mm
+    y -= 4*mm
+    # Draw the table, splitting it across pages as needed
+    avail_w = W - 2*margin
+    while pending is not None:
+        avail_h = y - BOT_TABLE
+        _, h = pending.wrapOn(c, avail_w, avail_h)
+        if h <= avail_h:
+            pending.drawOn(c, margin, y - h)
+            y -= h + 6*mm
+            break
+        parts = pending.split(avail_w, avail_h)
+        if parts:
+            _, h = parts[0].wrapOn(c, avail_w, avail_h)
+            parts[0].drawOn(c, margin, y - h)
+            pending = parts[1] if len(parts) > 1 else None
+        y = new_page()
 
     # Signature
-    if y < margin + 25*mm:
-        c.showPage(); y = H - margin - 20*mm
-    c.setFont("Helvetica-Bold", 10)
+    if y < BOT_BLOCK:
+        y = new_page()
+    sf("Helvetica-Bold", 10)
     c.drawString(margin, y, "Authorization")
-    y -= 8*mm; c.setFont("Helvetica", 9)
-    c.drawString(margin, y, f"Prepared by: {prepared_by}     Reviewed by: {reviewed_by}     Date: {datetime.now().strftime('%Y-%m-%d')}")
+    y -= 8*mm; sf("Helvetica", 9)
+    c.drawString(margin, y, f"Prepared by: {prepared_by}     Reviewed by: {reviewed_by}     Date: {generated_at.strftime('%Y-%m-%d')}")
     c.line(margin, y-1*mm, margin+55*mm, y-1*mm)
     c.line(margin+75*mm, y-1*mm, margin+130*mm, y-1*mm)
 
@@ -130,7 +221,7 @@ def pdf_report(summary_lines, table: pd.DataFrame):
 
 if uploaded is not None:
     with st.spinner("Parsing VCF..."):
-        df, meta = parse_vcf(uploaded)
+        df, meta = _cached_parse_vcf(uploaded.getvalue())
     st.success(f"Parsed {len(df)} variants. Samples: {', '.join(meta['samples']) if meta['samples'] else 'N/A'}")
 
     # Apply basic filters
@@ -146,19 +237,19 @@ if uploaded is not None:
     panel_genes = parse_panel(panel_upload)
     hpo_terms = [t.strip() for t in (hpo_text.replace("\n",",").split(",")) if t.strip()]
     hpo_map = None
+    gene_counts = None
     if hpo_file is not None:
         try:
-            import pandas as pd
-            if hpo_file.name.lower().endswith(".tsv"):
-                hpo_map = pd.read_csv(hpo_file, sep="\t")
-            else:
-                hpo_map = pd.read_csv(hpo_file)
-            hpo_map = load_hpo_map(hpo_map)
+            sep = "\t" if hpo_file.name.lower().endswith(".tsv") else ","
+            hpo_map = _cached_hpo_map(hpo_file.getvalue(), sep)
             st.success(f"HPO map loaded with {len(hpo_map)} entries.")
+            if hpo_terms:
+                # per-gene term counts depend only on the map and the term set
+                gene_counts = _cached_hpo_gene_counts(hpo_file.getvalue(), sep, tuple(sorted(set(hpo_terms))))
         except Exception as e:
             st.error(f"Failed to load HPO map: {e}")
 
-    scored = phenotype_score(f, hpo_terms, hpo_map=hpo_map, panel_genes=panel_genes)
+    scored = phenotype_score(f, hpo_terms, hpo_map=hpo_map, panel_genes=panel_genes, gene_counts=gene_counts)
     prioritized = prioritize(scored)
 
     # Summary lines
@@ -177,7 +268,11 @@ if uploaded is not None:
     st.dataframe(prioritized, use_container_width=True)
 
     st.download_button("⬇️ Download prioritized CSV", data=prioritized.to_csv(index=False).encode("utf-8"), file_name=f"{patient_id}_prioritized.csv", mime="text/csv")
-    pdf_bytes = pdf_report(summary, prioritized)
+    # Only the rows shown in the report are hashed for the cache key, and the
+    # timestamp is part of the key so a cached PDF never carries a stale date
+    pdf_bytes = pdf_report(summary, prioritized[VARIANT_COLS].head(40), report_title, lab_name,
+                           patient_id, sex, age, prepared_by, reviewed_by,
+                           datetime.now().replace(second=0, microsecond=0))
     st.download_button("⬇️ Download PDF report", data=pdf_bytes, file_name=f"{patient_id}_vcf_report.pdf", mime="application/pdf")
 
 st.divider()
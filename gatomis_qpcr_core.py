@@ -7,11 +7,24 @@ This module provides reusable functions to parse Ct tables (CSV/XLSX),
 apply QC rules, compute per-marker calls, and produce a final sample call.
 """
 
+from collections.abc import Sequence
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
 import pandas as pd
 import numpy as np
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # optional: CSV falls back to pandas' own parser
+    pa = None
+
+try:
+    import python_calamine  # noqa: F401
+    _EXCEL_ENGINE = "calamine"
+except ImportError:
+    _EXCEL_ENGINE = None
+
 # ----------- Config (versioned) -----------
 CONFIG = {
     "version": "0.1.0",
@@ -51,6 +64,65 @@ class SampleResult:
     marker_results: List[MarkerResult]
     notes: List[str]
 
+class SampleResults(Sequence):
+    """
+    Read-only list of SampleResult backed by the per-sample and per-marker
+    DataFrames. The dataclasses are only built when an item is accessed;
+    sample_results_to_df() reads the DataFrame directly.
+    """
+
+    def __init__(self, sample_df: pd.DataFrame, marker_df: pd.DataFrame, offsets: np.ndarray):
+        self.df = sample_df
+        self._markers = marker_df
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("sample result index out of range")
+        s = self.df.iloc[i]
+        m = self._markers.iloc[self._offsets[i]:self._offsets[i + 1]]
+        marker_results = [
+            MarkerResult(sample_id=sid, marker=mk, n_reps=int(n), ct_mean=float(cm), ct_sd=float(cs),
+                         ref_ct=float(rc), delta_ct=float(dc), qc_pass=bool(q), marker_positive=bool(mp))
+            for sid, mk, n, cm, cs, rc, dc, q, mp in m.itertuples(index=False, name=None)
+        ]
+        return SampleResult(
+            sample_id=s["sample_id"],
+            ref_marker=s["ref_marker"],
+            ref_ct=float(s["ref_ct"]),
+            ref_qc_pass=bool(s["ref_qc_pass"]),
+            n_markers_positive=int(s["n_markers_positive"]),
+            final_call=s["final_call"],
+            marker_results=marker_results,
+            notes=[s["notes"]] if s["notes"] else []
+        )
+
+def load_ct_table(file) -> pd.DataFrame:
+    """
+    Read a Ct table from CSV or Excel (path or uploaded file object), to be
+    passed to analyze_ct_table. CSV columns are all read as text, so sample
+    IDs such as "001" keep their leading zeros and non-numeric Ct cells
+    (e.g. "Undetermined") are coerced by _clean_df; pyarrow's multithreaded
+    reader is used when available.
+    """
+    name = str(getattr(file, "name", file)).lower()
+    if name.endswith(".csv"):
+        if pa is None:
+            return pd.read_csv(file, dtype=str)
+        header = pd.read_csv(file, nrows=0).columns
+        if hasattr(file, "seek"):
+            file.seek(0)
+        convert = pa_csv.ConvertOptions(column_types={c: pa.string() for c in header}, strings_can_be_null=True)
+        return pa_csv.read_csv(file, convert_options=convert).to_pandas()
+    return pd.read_excel(file, engine=_EXCEL_ENGINE)
+
 def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
     # Normalize columns
     cols = {c.lower().strip(): c for c in df.columns}
@@ -76,20 +148,23 @@ def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
     # Coerce types
     df2["sample_id"] = df2["sample_id"].astype(str).str.strip()
     df2["marker"] = df2["marker"].astype(str).str.strip()
+    # Uppercased marker, computed once for case-insensitive reference matching
+    df2["marker_u"] = df2["marker"].str.upper()
     # Ensure numeric ct
     df2["ct"] = pd.to_numeric(df2["ct"], errors="coerce")
     df2 = df2.dropna(subset=["sample_id", "marker", "ct"])
     return df2
 
-def analyze_ct_table(df: pd.DataFrame, reference_marker: str = "COL2A1") -> Tuple[pd.DataFrame, List[SampleResult]]:
+def analyze_ct_table(df: pd.DataFrame, reference_marker: str = "COL2A1") -> Tuple[pd.DataFrame, SampleResults]:
     """
     Input df with columns: sample_id, marker, ct (replicates allowed as multiple rows)
     Returns: (wide_table_df, sample_results_list)
     """
     df2 = _clean_df(df)
+    ref_u = reference_marker.upper()
 
     # Group to compute replicate stats
-    agg = df2.groupby(["sample_id", "marker"]).agg(
+    agg = df2.groupby(["sample_id", "marker", "marker_u"]).agg(
         ct_mean=("ct", "mean"),
         ct_sd=("ct", "std"),
         n_reps=("ct", "count")
@@ -98,100 +173,61 @@ def analyze_ct_table(df: pd.DataFrame, reference_marker: str = "COL2A1") -> Tupl
     # Fill NaN SD with 0 for single replicate
     agg["ct_sd"] = agg["ct_sd"].fillna(0.0)
 
-    sample_results: List[SampleResult] = []
-    rows = []
-
-    for sample_id, g in agg.groupby("sample_id"):
-        notes = []
-        # Reference
-        ref_rows = g[g["marker"].str.upper() == reference_marker.upper()]
-        if ref_rows.empty:
-            ref_ct = np.nan
-            ref_qc_pass = False
-            notes.append(f"Missing reference marker {reference_marker}.")
-        else:
-            ref_ct = float(ref_rows.iloc[0]["ct_mean"])
-            ref_sd = float(ref_rows.iloc[0]["ct_sd"])
-            # QC for reference: Ct threshold + replicate SD
-            ref_qc_pass = (ref_ct <= CONFIG["qc"]["ref_ct_max"]) and (ref_sd <= CONFIG["qc"]["replicate_sd_max"])
-
-        marker_results: List[MarkerResult] = []
-        n_pos = 0
-
-        for _, r in g.iterrows():
-            marker = str(r["marker"])
-            ct_mean = float(r["ct_mean"])
-            ct_sd = float(r["ct_sd"])
-            n_reps = int(r["n_reps"])
-
-            # compute ΔCt using ref_ct if available
-            delta_ct = ct_mean - ref_ct if pd.notna(ref_ct) else np.nan
-
-            # marker QC: replicate SD
-            m_qc = (ct_sd <= CONFIG["qc"]["replicate_sd_max"])
-
-            # marker positive logic
-            marker_positive = False
-            if ref_qc_pass and m_qc and pd.notna(ref_ct):
-                if (ct_mean <= CONFIG["marker_call"]["marker_ct_max"]) and (delta_ct <= CONFIG["marker_call"]["delta_ct_max"]):
-                    marker_positive = True
-
-            if marker_positive and marker.upper() != reference_marker.upper():
-                n_pos += 1
-
-            mr = MarkerResult(
-                sample_id=sample_id,
-                marker=marker,
-                n_reps=n_reps,
-                ct_mean=ct_mean,
-                ct_sd=ct_sd,
-                ref_ct=ref_ct if pd.notna(ref_ct) else np.nan,
-                delta_ct=delta_ct if pd.notna(delta_ct) else np.nan,
-                qc_pass=bool(m_qc),
-                marker_positive=bool(marker_positive if marker.upper()!=reference_marker.upper() else False)
-            )
-            marker_results.append(mr)
-
-            rows.append({
-                "sample_id": sample_id,
-                "marker": marker,
-                "n_reps": n_reps,
-                "ct_mean": round(ct_mean, 3),
-                "ct_sd": round(ct_sd, 3),
-                "ref_ct": None if pd.isna(ref_ct) else round(ref_ct, 3),
-                "delta_ct": None if pd.isna(delta_ct) else round(delta_ct, 3),
-                "qc_pass": m_qc,
-                "marker_positive": (marker_positive if marker.upper()!=reference_marker.upper() else False)
-            })
-
-        # Final call
-        if not ref_qc_pass:
-            final_call = "Invalid (Reference QC Fail)"
-        else:
-            min_pos = CONFIG["sample_call"]["min_positive_markers"]
-            if n_pos >= min_pos:
-                final_call = "Positive"
-            elif n_pos == 1:
-                final_call = "Indeterminate"
-            else:
-                final_call = "Negative"
-
-        sres = SampleResult(
-            sample_id=sample_id,
-            ref_marker=reference_marker,
-            ref_ct=float(ref_ct) if pd.notna(ref_ct) else np.nan,
-            ref_qc_pass=bool(ref_qc_pass),
-            n_markers_positive=int(n_pos),
-            final_call=final_call,
-            marker_results=marker_results,
-            notes=notes
-        )
-        sample_results.append(sres)
-
-    wide = pd.DataFrame(rows)
-    return wide, sample_results
-
-def sample_results_to_df(sample_results: List[SampleResult]) -> pd.DataFrame:
+    qc = CONFIG["qc"]
+    mc = CONFIG["marker_call"]
+
+    # Reference stats per sample (first matching marker), joined back onto every row
+    is_ref = agg["marker_u"] == ref_u
+    ref = (agg.loc[is_ref, ["sample_id", "ct_mean", "ct_sd"]]
+           .drop_duplicates("sample_id")
+           .rename(columns={"ct_mean": "ref_ct", "ct_sd": "ref_sd"}))
+    agg = agg.merge(ref, on="sample_id", how="left")
+
+    # ΔCt, QC flags and marker calls for all rows at once
+    agg["delta_ct"] = agg["ct_mean"] - agg["ref_ct"]
+    agg["ref_qc_pass"] = (agg["ref_ct"] <= qc["ref_ct_max"]) & (agg["ref_sd"] <= qc["replicate_sd_max"])
+    agg["qc_pass"] = agg["ct_sd"] <= qc["replicate_sd_max"]
+    agg["marker_positive"] = (agg["ref_qc_pass"] & agg["qc_pass"]
+                              & (agg["ct_mean"] <= mc["marker_ct_max"])
+                              & (agg["delta_ct"] <= mc["delta_ct_max"])
+                              & ~is_ref)
+
+    # Per-sample rollup and final call
+    sample_df = agg.groupby("sample_id", sort=True).agg(
+        ref_ct=("ref_ct", "first"),
+        ref_qc_pass=("ref_qc_pass", "first"),
+        n_markers_positive=("marker_positive", "sum"),
+        n_rows=("marker", "size")
+    ).reset_index()
+    n_pos = sample_df["n_markers_positive"]
+    sample_df["final_call"] = np.select(
+        [~sample_df["ref_qc_pass"], n_pos >= CONFIG["sample_call"]["min_positive_markers"], n_pos == 1],
+        ["Invalid (Reference QC Fail)", "Positive", "Indeterminate"],
+        default="Negative"
+    )
+    sample_df["notes"] = np.where(sample_df["ref_ct"].isna(), f"Missing reference marker {reference_marker}.", "")
+    sample_df.insert(1, "ref_marker", reference_marker)
+    # agg is sorted by sample_id, so each sample's markers are a contiguous slice
+    offsets = np.concatenate([[0], np.cumsum(sample_df.pop("n_rows").to_numpy())])
+
+    wide = pd.DataFrame({
+        "sample_id": agg["sample_id"],
+        "marker": agg["marker"],
+        "n_reps": agg["n_reps"],
+        "ct_mean": agg["ct_mean"].round(3),
+        "ct_sd": agg["ct_sd"].round(3),
+        "ref_ct": agg["ref_ct"].round(3),
+        "delta_ct": agg["delta_ct"].round(3),
+        "qc_pass": agg["qc_pass"],
+        "marker_positive": agg["marker_positive"]
+    })
+
+    marker_df = agg[["sample_id", "marker", "n_reps", "ct_mean", "ct_sd", "ref_ct", "delta_ct", "qc_pass", "marker_positive"]]
+    return wide, SampleResults(sample_df, marker_df, offsets)
+
+def sample_results_to_df(sample_results: Union[SampleResults, List[SampleResult]]) -> pd.DataFrame:
+    if isinstance(sample_results, SampleResults):
+        return sample_results.df.copy()
     rows = []
     for s in sample_results:
         rows.append({
@@ -7,40 +7,252 @@ Core utilities:
 """
 
 from typing import Dict, List, Tuple, Optional
-import io, gzip, re, json
+import io, os, gzip, json
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+except ImportError:  # optional: batches are held as pandas frames instead
+    pa = None
+
+try:
+    from isal import igzip as _gz  # ISA-L inflate, 2-3x faster than zlib
+except ImportError:  # optional: fall back to the stdlib decoder
+    _gz = gzip
+
+try:
+    from cyvcf2 import VCF  # htslib-backed parser for parse_vcf_fast
+except ImportError:
+    VCF = None
+
+try:
+    import re2  # DFA regex engine; scans a whole INFO field in one C call
+    _INFO_RE = re2.compile(r"([^=;]+)(=?)([^;]*)")
+except ImportError:
+    _INFO_RE = None
+
+try:
+    import numexpr as ne  # fused, cache-blocked evaluation of the priority score
+except ImportError:
+    ne = None
+
+try:
+    import rapidgzip  # block-parallel inflate for large .vcf.gz
+except ImportError:
+    rapidgzip = None
+
+# rapidgzip decoder threads for .vcf.gz input; <= 1 keeps the single-threaded decoder
+PARALLEL_GZIP = os.cpu_count() or 1
+
+# Bytes pulled from the (decompressed) input per read
+READ_BUFFER = 4 << 20
+
 # ------------ VCF parsing ------------
 
+def _wrap_text(raw):
+    # Give the text layer a READ_BUFFER-sized byte buffer to read from
+    if not isinstance(raw, io.BufferedReader):
+        raw = io.BufferedReader(raw, buffer_size=READ_BUFFER)
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="ignore")
+
+def _open_gzip(file_obj):
+    if rapidgzip is not None and PARALLEL_GZIP > 1:
+        raw = io.BufferedReader(rapidgzip.open(file_obj, parallelization=PARALLEL_GZIP), buffer_size=READ_BUFFER)
+    else:
+        raw = _gz.open(file_obj, "rb")
+    return _wrap_text(raw)
+
 def _open_text(file_obj):
     if isinstance(file_obj, (str, bytes)):
         if str(file_obj).endswith(".gz"):
-            return io.TextIOWrapper(gzip.open(file_obj, "rb"))
+            return _open_gzip(file_obj)
         else:
-            return open(file_obj, "r", encoding="utf-8", errors="ignore")
+            return _wrap_text(open(file_obj, "rb", buffering=READ_BUFFER))
     head = file_obj.read(2)
     file_obj.seek(0)
     if head == b"\x1f\x8b":
-        return io.TextIOWrapper(gzip.GzipFile(fileobj=file_obj, mode="rb"))
+        return _open_gzip(file_obj)
+    else:
+        return _wrap_text(file_obj)
+
+ANN_FIELDS = ["Allele","Annotation","Impact","Gene_Name","Gene_ID","Feature_Type","Feature_ID",
+              "Transcript_BioType","Rank/Total","HGVS.c","HGVS.p","cDNA.pos/cDNA.length",
+              "CDS.pos/CDS.length","AA.pos/AA.length","Distance","ERRORS/WARNINGS/INFO"]
+
+VCF_COLUMNS = ["CHROM","POS","REF","ALT","QUAL","FILTER","AF","DP","MQ","AD",
+               "GENE","CONSEQUENCE","IMPACT","HGVSc","HGVSp","GT"]
+
+_AF_KEYS = ("AF","AF_POPMAX","gnomAD_AF","VAF")  # first present one is the AF
+_MQ_KEYS = ("MQ",)
+_RANK = {"HIGH":3,"MODERATE":2,"LOW":1,"MODIFIER":0}
+_TI_PAIRS = frozenset({("A","G"),("G","A"),("C","T"),("T","C")})
+
+def _new_stats():
+    return {"n_total":0,"n_pass":0,"snps":0,"indels":0,
+            "by_chrom":defaultdict(int),"filters":defaultdict(int),"ti":0,"tv":0}
+
+def _csq_format(header_text):
+    idx = header_text.find("Format:")
+    if idx < 0:
+        return None
+    body = header_text[idx + 7:]
+    for stop in ('"', ">"):
+        cut = body.find(stop)
+        if cut >= 0:
+            body = body[:cut]
+    if not body:
+        return None
+    return [f.strip() for f in body.split("|")]
+
+def _count_variant(stats, chrom, flt):
+    stats["n_total"] += 1
+    stats["filters"][flt] += 1
+    if flt in ("PASS","."):
+        stats["n_pass"] += 1
+    stats["by_chrom"][chrom] += 1
+
+def _count_alleles(stats, refs, alts):
+    """Tally SNP/indel and Ti/Tv over every ALT allele of the given records."""
+    snps = indels = ti = 0
+    ti_pairs = _TI_PAIRS
+    for ref, alt in zip(refs, alts):
+        ref_is_base = len(ref) == 1
+        for a in alt.split(","):
+            if ref_is_base and len(a) == 1:
+                snps += 1
+                if (ref, a) in ti_pairs:
+                    ti += 1
+            else:
+                indels += 1
+    stats["snps"] += snps
+    stats["indels"] += indels
+    stats["ti"] += ti
+    stats["tv"] += snps - ti
+
+_IMPACT_COLUMNS = ["GENE","CONSEQUENCE","IMPACT","HGVSc","HGVSp"]
+# Position of each output column in a SnpEff ANN entry
+_ANN_POS = {"GENE":3, "CONSEQUENCE":1, "IMPACT":2, "HGVSc":9, "HGVSp":10}
+
+def _best_entries(rows, raw, positions):
+    """
+    For every annotation string (comma-separated entries of '|'-separated
+    fields), pick the first entry with the highest IMPACT rank and return the
+    fields at `positions` (column -> index, None if absent) as arrays aligned
+    with `rows`. Entries are only split up to IMPACT while ranking; the
+    winner alone is split in full.
+    """
+    ip = positions["IMPACT"]
+    rank_of = _RANK.get
+    items = list(positions.items())
+    out = {col: [] for col, _ in items}
+    for value in raw:
+        entries = value.split(",")
+        best = entries[0]
+        if ip is not None and len(entries) > 1:
+            best_rank = -1
+            for e in entries:
+                f = e.split("|", ip + 1)
+                r = rank_of(f[ip], 0) if len(f) > ip else 0
+                if r > best_rank:
+                    best_rank = r; best = e
+                    if r == 3:
+                        break  # HIGH cannot be beaten
+        f = best.split("|")
+        n = len(f)
+        for col, p in items:
+            out[col].append(f[p] if p is not None and p < n else "")
+    return {col: np.array(vals, dtype=object) for col, vals in out.items()}
+
+def _fill_best_impact(cols, ann_rows, ann_raw, csq_rows, csq_raw, csq_fields):
+    """Set the GENE..HGVSp columns from the collected ANN (preferred) and CSQ strings."""
+    n = len(cols["CHROM"])
+    out = {col: np.full(n, None, dtype=object) for col in _IMPACT_COLUMNS}
+    if ann_rows:
+        for col, vals in _best_entries(ann_rows, ann_raw, _ANN_POS).items():
+            out[col][ann_rows] = vals
+    if csq_rows:
+        # last occurrence wins, as when the CSQ fields were read into a dict
+        pos = {name: i for i, name in enumerate(csq_fields or [])}
+        best = _best_entries(csq_rows, csq_raw, {
+            "GENE": pos.get("SYMBOL"), "CONSEQUENCE": pos.get("Consequence"),
+            "CONSEQUENCE_UPPER": pos.get("CONSEQUENCE"), "IMPACT": pos.get("IMPACT"),
+            "HGVSc": pos.get("HGVSc"), "HGVSp": pos.get("HGVSp")})
+        cons = best.pop("CONSEQUENCE")
+        best["CONSEQUENCE"] = np.where(cons == "", best.pop("CONSEQUENCE_UPPER"), cons)
+        for col, vals in best.items():
+            out[col][csq_rows] = vals
+    for col in _IMPACT_COLUMNS:
+        cols[col] = out[col].tolist()
+
+# Rows buffered as Python objects before they are moved into a columnar batch
+BATCH_ROWS = 50000
+
+# Low-cardinality text columns, stored as categoricals (Arrow dictionaries)
+CATEGORY_COLUMNS = ["CHROM","FILTER","GENE","IMPACT","CONSEQUENCE"]
+# Narrow numeric columns: coordinates fit int32 and QUAL/DP/MQ need no more
+# than float32. AF stays float64 as it is compared against user thresholds
+NUMERIC_DTYPES = {"POS": np.int32, "QUAL": np.float32, "AF": np.float64,
+                  "DP": np.float32, "MQ": np.float32}
+
+def _arrow_type(c):
+    if c in NUMERIC_DTYPES:
+        return pa.from_numpy_dtype(NUMERIC_DTYPES[c])
+    if c in CATEGORY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+_ARROW_SCHEMA = None if pa is None else pa.schema([(c, _arrow_type(c)) for c in VCF_COLUMNS])
+
+def _flush_batch(cols, impact, csq_fields, stats, batches):
+    """Finish the buffered rows (best impact, allele stats), store them as one batch and empty the buffers."""
+    if batches and not cols["CHROM"]:
+        return  # nothing buffered since the last batch
+    ann_rows, ann_raw, csq_rows, csq_raw = impact
+    _fill_best_impact(cols, ann_rows, ann_raw, csq_rows, csq_raw, csq_fields)
+    _count_alleles(stats, cols["REF"], cols["ALT"])
+    if pa is not None:
+        batches.append(pa.RecordBatch.from_pydict(cols, schema=_ARROW_SCHEMA))
     else:
-        return io.TextIOWrapper(file_obj, encoding="utf-8", errors="ignore")
+        batches.append(pd.DataFrame(cols))
+    for buf in (*cols.values(), *impact):
+        buf.clear()
+
+def _batches_to_frame(batches):
+    if pa is not None:
+        table = pa.Table.from_batches(batches, schema=_ARROW_SCHEMA)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    df = batches[0] if len(batches) == 1 else pd.concat(batches, ignore_index=True)
+    return df.astype({**NUMERIC_DTYPES, **{c: "category" for c in CATEGORY_COLUMNS}})
 
 def parse_vcf(file_obj, max_variants: int = 500000):
     fh = _open_text(file_obj)
     csq_fields = None
-    ann_fields = ["Allele","Annotation","Impact","Gene_Name","Gene_ID","Feature_Type","Feature_ID",
-                  "Transcript_BioType","Rank/Total","HGVS.c","HGVS.p","cDNA.pos/cDNA.length",
-                  "CDS.pos/CDS.length","AA.pos/AA.length","Distance","ERRORS/WARNINGS/INFO"]
     samples = []
-    records = []
-    stats = {"n_total":0,"n_pass":0,"snps":0,"indels":0,"by_chrom":{},"filters":{},"ti":0,"tv":0}
+    # One list per output column (structure of arrays), so no per-record dict
+    # is built and pandas does not have to transpose rows into columns. Every
+    # BATCH_ROWS rows the lists are moved into a columnar (Arrow) batch, which
+    # bounds the number of live Python objects
+    cols = {k: [] for k in VCF_COLUMNS}
+    (chrom_c, pos_c, ref_c, alt_c, qual_c, flt_c, af_c, dp_c, mq_c, ad_c,
+     _, _, _, _, _, gt_c) = cols.values()
+    # Raw ANN/CSQ strings and their batch row numbers; the best entry per row
+    # is picked for a whole batch at once (_fill_best_impact)
+    impact = ann_rows, ann_raw, csq_rows, csq_raw = [], [], [], []
+    batches = []
+    stats = _new_stats()
+    by_chrom, filters = stats["by_chrom"], stats["filters"]
+    n_total = n_pass = 0
+    info_re = _INFO_RE
+    to_first_float, af_keys, mq_keys = first_float, _AF_KEYS, _MQ_KEYS
+    fmt_cache = {}
 
     for line in fh:
         if line.startswith("##"):
             if line.startswith("##INFO=<ID=CSQ"):
-                m = re.search(r"Format:\s*([^\">]+)", line)
-                if m:
-                    csq_fields = [f.strip() for f in m.group(1).split("|")]
+                csq_fields = _csq_format(line) or csq_fields
             continue
         if line.startswith("#CHROM"):
             parts = line.rstrip("\n").split("\t")
@@ -51,98 +263,245 @@ def parse_vcf(file_obj, max_variants: int = 500000):
     for line in fh:
         if not line or line.startswith("#"):
             continue
-        parts = line.rstrip("\n").split("\t")
+        # Only the fixed columns and the first sample are read, so any further
+        # sample columns stay in one unsplit tail (parts[10])
+        parts = line.rstrip("\n").split("\t", 10)
         if len(parts) < 8:
             continue
         chrom, pos, vid, ref, alt, qual, flt, info = parts[:8]
         fmt = parts[8] if len(parts) > 8 else None
-        sample_vals = parts[9:] if len(parts) > 9 else []
         gt = None
         ad = None
         dp = None
-        if fmt and sample_vals:
-            fmt_keys = fmt.split(":")
-            sv = sample_vals[0].split(":")
-            fm = dict(zip(fmt_keys, sv))
-            gt = fm.get("GT", None)
-            dp = _to_float(fm.get("DP", None))
-            ad = fm.get("AD", None)
-
-        stats["n_total"] += 1
-        stats["filters"][flt] = stats["filters"].get(flt, 0) + 1
+        if fmt and len(parts) > 9:
+            # FORMAT is usually identical across records: resolve the GT/DP/AD
+            # positions once per distinct FORMAT string
+            fmt_idx = fmt_cache.get(fmt)
+            if fmt_idx is None:
+                pos_of = {k: i for i, k in enumerate(fmt.split(":"))}
+                fmt_idx = fmt_cache[fmt] = (pos_of.get("GT"), pos_of.get("DP"), pos_of.get("AD"))
+            gt_i, dp_i, ad_i = fmt_idx
+            sv = parts[9].split(":")
+            n_sv = len(sv)
+            if gt_i is not None and gt_i < n_sv:
+                gt = sv[gt_i]
+            if dp_i is not None and dp_i < n_sv:
+                dp = _to_float(sv[dp_i])
+            if ad_i is not None and ad_i < n_sv:
+                ad = sv[ad_i]
+
+        # _count_variant inlined over locals; written back to stats after the loop
+        n_total += 1
+        filters[flt] += 1
         if flt in ("PASS","."):
-            stats["n_pass"] += 1
-        alt_alleles = alt.split(",")
-        for a in alt_alleles:
-            if len(ref)==1 and len(a)==1:
-                stats["snps"] += 1
-                if (ref, a) in [("A","G"),("G","A"),("C","T"),("T","C")]:
-                    stats["ti"] += 1
-                else:
-                    stats["tv"] += 1
-            else:
-                stats["indels"] += 1
-        stats["by_chrom"][chrom]=stats["by_chrom"].get(chrom,0)+1
-
-        info_dict = {}
-        for kv in info.split(";"):
-            if not kv: 
-                continue
-            if "=" in kv:
-                k,v = kv.split("=",1)
-                info_dict[k]=v
-            else:
-                info_dict[kv]=True
+            n_pass += 1
+        by_chrom[chrom] += 1
+
+        if info_re is not None:
+            info_dict = {k: (v if eq else True) for k, eq, v in info_re.findall(info)}
+        else:
+            info_dict = {}
+            for kv in info.split(";"):
+                k, eq, v = kv.partition("=")
+                if k:
+                    info_dict[k] = v if eq else True
 
-        af = first_float(info_dict, ["AF","AF_POPMAX","gnomAD_AF","VAF"])
-        mq = first_float(info_dict, ["MQ"])
+        af = to_first_float(info_dict, af_keys)
+        mq = to_first_float(info_dict, mq_keys)
 
-        gene = None; conseq=None; impact=None; hgvsc=None; hgvsp=None
         if "ANN" in info_dict:
-            ann_entries = info_dict["ANN"].split(",")
-            rank = {"HIGH":3,"MODERATE":2,"LOW":1,"MODIFIER":0}
-            best=None; best_rank=-1
-            for e in ann_entries:
-                fields = e.split("|")
-                fields += [""]*(len(ann_fields)-len(fields))
-                ann, imp, sym, hgc, hgp = fields[1], fields[2], fields[3], fields[9], fields[10]
-                r = rank.get(imp,0)
-                if r>best_rank:
-                    best_rank=r; best=(sym, ann, imp, hgc, hgp)
-            if best:
-                gene, conseq, impact, hgvsc, hgvsp = best
+            ann_rows.append(len(chrom_c)); ann_raw.append(info_dict["ANN"])
         elif "CSQ" in info_dict:
-            csq_entries = info_dict["CSQ"].split(",")
-            fields = csq_fields or []
-            rank = {"HIGH":3,"MODERATE":2,"LOW":1,"MODIFIER":0}
-            best=None; best_rank=-1
-            for e in csq_entries:
-                vals = e.split("|")
-                d = { fields[i] if i<len(fields) else f"F{i}": (vals[i] if i<len(vals) else "") for i in range(max(len(vals), len(fields))) }
-                imp = d.get("IMPACT","")
-                sym = d.get("SYMBOL","")
-                cons = d.get("Consequence","") or d.get("CONSEQUENCE","")
-                hgc = d.get("HGVSc","")
-                hgp = d.get("HGVSp","")
-                r = rank.get(imp,0)
-                if r>best_rank:
-                    best_rank=r; best=(sym, cons, imp, hgc, hgp)
-            if best:
-                gene, conseq, impact, hgvsc, hgvsp = best
-
-        rec = {
-            "CHROM": chrom, "POS": int(pos),
-            "REF": ref, "ALT": alt,
-            "QUAL": _to_float(qual), "FILTER": flt,
-            "AF": af, "DP": dp, "MQ": mq, "AD": ad,
-            "GENE": gene, "CONSEQUENCE": conseq, "IMPACT": impact,
-            "HGVSc": hgvsc, "HGVSp": hgvsp, "GT": gt
-        }
-        records.append(rec)
-        if len(records) >= max_variants:
+            csq_rows.append(len(chrom_c)); csq_raw.append(info_dict["CSQ"])
+
+        chrom_c.append(chrom); pos_c.append(int(pos))
+        ref_c.append(ref); alt_c.append(alt)
+        qual_c.append(_to_float(qual)); flt_c.append(flt)
+        af_c.append(af); dp_c.append(dp); mq_c.append(mq); ad_c.append(ad)
+        gt_c.append(gt)
+        if n_total >= max_variants:
             break
+        if len(chrom_c) >= BATCH_ROWS:
+            _flush_batch(cols, impact, csq_fields, stats, batches)
+
+    _flush_batch(cols, impact, csq_fields, stats, batches)
+    stats.update(n_total=n_total, n_pass=n_pass)
+    return _batches_to_frame(batches), {"samples": samples, "stats": stats}
+
+# htslib sentinels for missing values and vector padding in integer FORMAT arrays
+_BCF_INT_MISSING = -2147483648
+_BCF_INT_VECTOR_END = -2147483647
+
+def _first_info(info, keys):
+    for k in keys:
+        val = info.get(k)
+        if val is None or isinstance(val, bool):
+            continue
+        if isinstance(val, (tuple, list)):
+            val = val[0]
+        try:
+            return float(str(val).split(",")[0])
+        except (TypeError, ValueError):
+            pass
+    return None
+
+_RECORD_COLUMNS = [c for c in VCF_COLUMNS if c not in _IMPACT_COLUMNS]
+
+def parse_vcf_fast(file_obj, max_variants: int = 500000):
+    """
+    parse_vcf on top of cyvcf2/htslib: tokenization happens in C and the
+    columns are filled directly, so the DataFrame is built once.
+    Same DataFrame schema and meta as parse_vcf. htslib does not keep a
+    "." FILTER apart from PASS, so both are reported as PASS.
+    Falls back to parse_vcf for file-like objects or when cyvcf2 is missing.
+    """
+    if VCF is None or not isinstance(file_obj, str):
+        return parse_vcf(file_obj, max_variants=max_variants)
+    vcf = VCF(file_obj)
+    try:
+        csq_fields = _csq_format(vcf.get_header_type("CSQ").get("Description", ""))
+    except KeyError:
+        csq_fields = None
+    samples = list(vcf.samples)
+    stats = _new_stats()
+    cols = {k: [] for k in VCF_COLUMNS}
+    impact = ann_rows, ann_raw, csq_rows, csq_raw = [], [], [], []
+    batches = []
+
+    for rec in vcf:
+        chrom, ref, alts = rec.CHROM, rec.REF, rec.ALT
+        alt = ",".join(alts) or "."
+        flt = rec.FILTER or "PASS"
+        _count_variant(stats, chrom, flt)
+
+        gt = None; dp = None; ad = None
+        if samples:
+            fmt = rec.FORMAT
+            if "GT" in fmt:
+                *alleles, phased = rec.genotypes[0]
+                gt = ("|" if phased else "/").join("." if a < 0 else str(a) for a in alleles)
+            if "DP" in fmt:
+                d = rec.format("DP")[0][0]
+                dp = None if d < 0 else float(d)
+            if "AD" in fmt:
+                ad = ",".join("." if x == _BCF_INT_MISSING else str(x)
+                              for x in rec.format("AD")[0] if x != _BCF_INT_VECTOR_END)
+
+        info = rec.INFO
+        ann = info.get("ANN")
+        csq = info.get("CSQ")
+        if ann is not None:
+            ann_rows.append(len(cols["CHROM"])); ann_raw.append(ann)
+        elif csq is not None:
+            csq_rows.append(len(cols["CHROM"])); csq_raw.append(csq)
+
+        row = (chrom, rec.POS, ref, alt, rec.QUAL, flt,
+               _first_info(info, _AF_KEYS), dp,
+               _first_info(info, _MQ_KEYS), ad, gt)
+        for k, val in zip(_RECORD_COLUMNS, row):
+            cols[k].append(val)
+        if stats["n_total"] >= max_variants:
+            break
+        if len(cols["CHROM"]) >= BATCH_ROWS:
+            _flush_batch(cols, impact, csq_fields, stats, batches)
+
+    vcf.close()
+    _flush_batch(cols, impact, csq_fields, stats, batches)
+    return _batches_to_frame(batches), {"samples": samples, "stats": stats}
+
+# Plain VCFs smaller than this are parsed in-process; worker start-up would dominate
+PARALLEL_MIN_BYTES = 64 << 20
 
-    return pd.DataFrame(records), {"samples": samples, "stats": stats}
+def _header_end(fh):
+    """Byte offset just past the #CHROM line (or EOF), where parse_vcf starts reading records."""
+    fh.seek(0)
+    while True:
+        line = fh.readline()
+        if not line or line.startswith(b"#CHROM"):
+            return fh.tell()
+
+def _parse_range(path, header_end, start, end, max_variants):
+    with open(path, "rb") as fh:
+        header = fh.read(header_end)
+        fh.seek(start)
+        body = fh.read(end - start)
+    return parse_vcf(io.BytesIO(header + body), max_variants=max_variants)
+
+def _frame_stats(df):
+    """The parse_vcf stats, recomputed from a parsed frame."""
+    stats = _new_stats()
+    flt = df["FILTER"].astype(object)
+    chrom = df["CHROM"].astype(object)
+    stats["n_total"] = len(df)
+    stats["n_pass"] = int(flt.isin(["PASS","."]).sum())
+    stats["filters"].update({k: int(n) for k, n in flt.value_counts(sort=False).items()})
+    stats["by_chrom"].update({k: int(n) for k, n in chrom.value_counts(sort=False).items()})
+    _count_alleles(stats, df["REF"].to_numpy(dtype=object), df["ALT"].to_numpy(dtype=object))
+    return stats
+
+def _line_ranges(path, start, end, chunk):
+    """Split [start, end) into ranges of about chunk bytes, each ending just after a newline (or at end)."""
+    bounds = [start]
+    with open(path, "rb") as fh:
+        while bounds[-1] < end:
+            target = bounds[-1] + chunk
+            if target >= end:
+                bounds.append(end)
+                break
+            fh.seek(target - 1)
+            fh.readline()  # advance to the start of the next line
+            bounds.append(min(fh.tell(), end))
+    return list(zip(bounds, bounds[1:]))
+
+def parse_vcf_parallel(file_obj, max_variants: int = 500000, workers: Optional[int] = None):
+    """
+    parse_vcf over line-aligned byte ranges of an uncompressed VCF in worker
+    processes, concatenated in file order.
+    Work is done in waves of one range per worker, each covering about the
+    bytes still needed for max_variants records at the bytes-per-record seen
+    so far, so a capped parse does not read the rest of a large file.
+    Gzipped files, file-like objects and inputs under PARALLEL_MIN_BYTES are
+    parsed in-process by parse_vcf (plain gzip has no seekable block index).
+    """
+    if (not isinstance(file_obj, str) or file_obj.endswith(".gz")
+            or os.path.getsize(file_obj) < PARALLEL_MIN_BYTES):
+        return parse_vcf(file_obj, max_variants=max_variants)
+    workers = workers or os.cpu_count() or 1
+    if workers < 2:
+        return parse_vcf(file_obj, max_variants=max_variants)
+    size = os.path.getsize(file_obj)
+    with open(file_obj, "rb") as fh:
+        header_end = _header_end(fh)
+        sample = fh.read(1 << 20)
+    bytes_per_row = len(sample) / max(1, sample.count(b"\n"))
+
+    def bytes_for(rows):
+        # 5% headroom so that one wave usually reaches max_variants
+        return int(rows * bytes_per_row * 1.05) + 1
+
+    if min(size - header_end, bytes_for(max_variants)) < PARALLEL_MIN_BYTES:
+        return parse_vcf(file_obj, max_variants=max_variants)
+
+    results, n_rows, pos = [], 0, header_end
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while n_rows < max_variants and pos < size:
+            remaining = max_variants - n_rows
+            wave_end = _line_ranges(file_obj, pos, size, bytes_for(remaining))[0][1]
+            futures = [executor.submit(_parse_range, file_obj, header_end, start, end, remaining)
+                       for start, end in _line_ranges(file_obj, pos, wave_end, -(-(wave_end - pos) // workers))]
+            for future in futures:
+                if n_rows >= max_variants:
+                    future.cancel()
+                    continue
+                results.append(future.result())
+                n_rows += len(results[-1][0])
+            pos = wave_end
+            if n_rows:
+                bytes_per_row = (pos - header_end) / n_rows
+    df = pd.concat([part for part, _ in results], ignore_index=True).head(max_variants)
+    # Each range has its own categories; concat falls back to object, so re-intern
+    df = df.astype({c: "category" for c in CATEGORY_COLUMNS})
+    return df, {"samples": results[0][1]["samples"], "stats": _frame_stats(df)}
 
 def _to_float(x):
     try:
@@ -150,17 +509,31 @@ def _to_float(x):
     except Exception:
         return None
 
-def first_float(info_dict, keys):
+def first_float(info_dict, keys=_AF_KEYS):
     for k in keys:
-        if k in info_dict:
-            try:
-                return float(str(info_dict[k]).split(",")[0])
-            except:
-                pass
+        v = info_dict.get(k)
+        if v is None or v is True:
+            continue
+        if v.__class__ is not str:
+            v = str(v)
+        try:
+            return float(v if "," not in v else v.split(",", 1)[0])
+        except ValueError:
+            pass
     return None
 
 # ------------ Phenotype utilities ------------
 
+def _factorize(col: pd.Series):
+    """
+    Category codes of col and the label for each code, with a trailing ""
+    label so missing values (code -1) index it. Categorical columns are
+    used as-is, so per-label work is done once per distinct value.
+    """
+    cat = pd.Categorical(col)
+    labels = np.append(cat.categories.astype(str).to_numpy(dtype=object), "")
+    return cat.codes, pd.Series(labels, dtype=object)
+
 def load_hpo_map(df_or_file) -> pd.DataFrame:
     """
     Accepts CSV/TSV with columns: HPO_ID, GeneSymbol
@@ -184,30 +557,49 @@ def load_hpo_map(df_or_file) -> pd.DataFrame:
     out["HPO_ID"] = out["HPO_ID"].astype(str).str.strip()
     return out
 
-def phenotype_score(variants_df: pd.DataFrame, hpo_terms: List[str], hpo_map: Optional[pd.DataFrame]=None, panel_genes: Optional[List[str]]=None):
+def hpo_gene_counts(hpo_map: pd.DataFrame, hpo_terms: List[str]) -> pd.Series:
+    """
+    Number of the given HPO terms mapping to each GeneSymbol in hpo_map.
+    Callers scoring many VCFs against the same map and terms can compute
+    this once and pass it to phenotype_score as gene_counts.
+    """
+    hpo_terms = [t.strip() for t in hpo_terms if t.strip()]
+    return hpo_map.loc[hpo_map["HPO_ID"].isin(hpo_terms), "GeneSymbol"].value_counts()
+
+def phenotype_score(variants_df: pd.DataFrame, hpo_terms: List[str], hpo_map: Optional[pd.DataFrame]=None, panel_genes: Optional[List[str]]=None, inplace: bool=False, gene_counts: Optional[pd.Series]=None):
     """
     Adds columns:
     - PHENO_MATCH (bool)
     - PHENO_SCORE (int): count of HPO terms mapping to the gene
     - PANEL_MATCH (bool): if gene is in provided panel
+    gene_counts, if given, is hpo_gene_counts(hpo_map, hpo_terms) and is
+    used instead of recomputing it from hpo_map.
+    With inplace=True the columns are written to variants_df itself;
+    otherwise to a shallow copy, so the input's data is never duplicated.
     """
-    v = variants_df.copy()
+    v = variants_df if inplace else variants_df.copy(deep=False)
     v["PHENO_MATCH"] = False
-    v["PHENO_SCORE"] = 0
+    v["PHENO_SCORE"] = np.int32(0)
     v["PANEL_MATCH"] = False
 
-    if hpo_map is not None and len(hpo_terms)>0:
-        hpo_terms = [t.strip() for t in hpo_terms if t.strip()]
-        gene_counts = (hpo_map[hpo_map["HPO_ID"].isin(hpo_terms)]
-                       .groupby("GeneSymbol").size().to_dict())
-        v["GENE_UP"] = v["GENE"].fillna("").str.upper()
-        v["PHENO_SCORE"] = v["GENE_UP"].map(gene_counts).fillna(0).astype(int)
+    use_hpo = (hpo_map is not None or gene_counts is not None) and len(hpo_terms)>0
+    use_panel = panel_genes is not None and len(panel_genes)>0
+    if use_hpo or use_panel:
+        # Upper-case each distinct gene once; both lookups below are built per
+        # category and gathered per variant by category code
+        codes, genes = _factorize(v["GENE"])
+        genes = genes.str.upper()
+
+    if use_hpo:
+        if gene_counts is None:
+            gene_counts = hpo_gene_counts(hpo_map, hpo_terms)
+        lookup = genes.map(gene_counts).fillna(0).to_numpy(dtype=np.int32)
+        v["PHENO_SCORE"] = lookup[codes]
         v["PHENO_MATCH"] = v["PHENO_SCORE"] > 0
-        v.drop(columns=["GENE_UP"], inplace=True)
 
-    if panel_genes is not None and len(panel_genes)>0:
+    if use_panel:
         panel_set = set([g.strip().upper() for g in panel_genes if g and isinstance(g, str)])
-        v["PANEL_MATCH"] = v["GENE"].fillna("").str.upper().isin(panel_set)
+        v["PANEL_MATCH"] = genes.isin(panel_set).to_numpy()[codes]
 
     return v
 
@@ -217,9 +609,23 @@ def prioritize(df: pd.DataFrame):
     Score = w1*(impact_rank) + w2*(pheno_score) + w3*(rarity)
     """
     imp_rank = {"HIGH":3, "MODERATE":2, "LOW":1, "MODIFIER":0}
-    f = df.copy()
-    f["IMPACT_RANK"] = f["IMPACT"].map(imp_rank).fillna(0)
+    f = df.copy(deep=False)  # only new columns are added; payload columns stay shared
+    codes, impacts = _factorize(f["IMPACT"])
+    f["IMPACT_RANK"] = impacts.map(imp_rank).fillna(0).to_numpy()[codes]
+    ir = f["IMPACT_RANK"].to_numpy(dtype=np.float64)
+    ps = f["PHENO_SCORE"].to_numpy(dtype=np.float64)
     # rarity: 1 - AF (unknown AF treated as 0.5)
-    rarity = 1 - f["AF"].fillna(0.5).clip(0,1)
-    f["PRIORITY_SCORE"] = (2.0*f["IMPACT_RANK"]) + (1.5*f["PHENO_SCORE"]) + (1.0*rarity)
-    return f.sort_values(["PANEL_MATCH","PHENO_MATCH","PRIORITY_SCORE"], ascending=[False, False, False]).reset_index(drop=True)
+    af = f["AF"].fillna(0.5).clip(0,1).to_numpy(dtype=np.float64)
+    if ne is not None:
+        score = ne.evaluate("2.0*ir + 1.5*ps + (1.0 - af)")
+    else:
+        score = 2.0*ir
+        score += 1.5*ps
+        score += 1.0 - af
+    f["PRIORITY_SCORE"] = score
+    # PANEL_MATCH, PHENO_MATCH, PRIORITY_SCORE, all descending; np.lexsort
+    # takes the primary key last and is stable, like the multi-key sort_values
+    order = np.lexsort((-f["PRIORITY_SCORE"].to_numpy(),
+                        ~f["PHENO_MATCH"].to_numpy(dtype=bool),
+                        ~f["PANEL_MATCH"].to_numpy(dtype=bool)))
+    return f.take(order).reset_index(drop=True)